@@ -3,6 +3,8 @@ from .Base.Core import APIClient, NONE
 from .Base.Wrappers import UNIVERSAL
 
 from typing import Literal
+import asyncio
+import httpx
 
 class Antipublic(APIClient):
     """
@@ -63,7 +65,9 @@ class Antipublic(APIClient):
             delay_min=delay_min,
             logger_name=Antipublic.__qualname__,
             proxy=proxy,
-            timeout=timeout
+            timeout=timeout,
+            http2=True,  # All endpoints share one keep-alive client, so requests are multiplexed over single connection
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=32, keepalive_expiry=60)
         )
         self.settings.delay.set(0)
         self.settings.delay.disable()  # No delay for antipublic hmm
@@ -72,6 +76,8 @@ class Antipublic(APIClient):
         self.account = self.__Account(core=self)
 
     class __Info:
+        __slots__ = ("core",)
+
         def __init__(self, core: APIClient):
             self.core = core
 
@@ -112,6 +118,8 @@ class Antipublic(APIClient):
             return await self.core.request("GET", "/version")
 
     class __Account:
+        __slots__ = ("core",)
+
         def __init__(self, core: APIClient):
             self.core = core
 
@@ -147,6 +155,22 @@ class Antipublic(APIClient):
             """
             return await self.core.request("GET", "/availableQueries")
 
+    @UNIVERSAL()
+    async def preflight(self):
+        """
+        *Get lines count, version, access and available queries at once*
+
+        Requests are sent concurrently over the same connection.
+
+        **Example:**
+
+        ```python
+        lines, version, access, queries = antipublic.preflight()
+        print(lines.json(), version.json(), access.json(), queries.json())
+        ```
+        """
+        return await asyncio.gather(self.info.lines(), self.info.version(), self.account.access(), self.account.queries())
+
     @UNIVERSAL()
     async def check(self, lines: list[str], insert: bool = False):
         """
@@ -170,6 +194,49 @@ class Antipublic(APIClient):
         json = {"lines": lines, "insert": insert}
         return await self.core.request("POST", "/checkLines", json=json)
 
+    @UNIVERSAL()
+    async def check_many(self, lines: list[str], insert: bool = False, concurrency: int = 8, chunk: int = 1000):
+        """
+        POST https://antipublic.one/api/v2/checkLines
+
+        *Check any amount of lines in the AntiPublic db*
+
+        Lines are split into chunks and sent concurrently over the same connection.
+
+        **Parameters:**
+
+        - **lines** (list[str]): Lines for check (email:password or login:password).
+        - **insert** (bool): Upload private rows to AntiPublic db.
+        - **concurrency** (int): Maximum amount of requests running at the same time.
+        - **chunk** (int): Lines per request.
+          > Maximum 1000 lines per request.
+
+        **Example:**
+
+        ```python
+        responses = antipublic.check_many(lines=["email:password", "login:password"] * 5000, insert=True)
+        for response in responses:
+            print(response.json())
+        ```
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if not 1 <= chunk <= 1000:
+            raise ValueError("chunk must be between 1 and 1000")
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check_chunk(lines_chunk: list[str]):
+            async with semaphore:
+                return await self.check(lines=lines_chunk, insert=insert)
+        tasks = [asyncio.ensure_future(check_chunk(lines[i:i + chunk])) for i in range(0, len(lines), chunk)]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:  # Don't leave remaining chunks pending on the loop to be uploaded later
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
     @UNIVERSAL()
     async def search(self, searchBy: Constants.Antipublic.SearchBy._Literal,
                      query: dict[Constants.Antipublic.SearchBy._Literal, str],
@@ -14,9 +14,14 @@ from httpx._utils import URLPattern
 from importlib.metadata import version, PackageNotFoundError
 from binascii import Error as binasciiError
 from urllib.parse import parse_qs, urlparse
-from ..Base.Wrappers import RETRY, UNIVERSAL, wraps
+from ..Base.Wrappers import RETRY, UNIVERSAL, wraps, _capture_var
 from ..Base.Exceptions import BAD_TOKEN, BAD_ENDPOINT
 
+try:
+    import orjson  # Optional speedup for json bodies
+except ImportError:
+    orjson = None
+
 # TODO: Shithead, implement fucking synchronizer
 
 
@@ -25,12 +30,14 @@ class APIClient:
     Base API Client class
     """
 
-    def __init__(self, base_url: str, token: str, language: str = None, delay_min: float = 0, logger_name: str = "APIClient", proxy: str = None, timeout: float = 90, verify: bool = True):
+    def __init__(self, base_url: str, token: str, language: str = None, delay_min: float = 0, logger_name: str = "APIClient", proxy: str = None, timeout: float = 90, verify: bool = True, http2: bool = False, limits: httpx.Limits = None):
         self.core = self
         from ..__init__ import Antipublic  # Circular import issue
         self.settings = Settings(core=self)
         self.settings._isAntipublic = isinstance(self, Antipublic)
-        self.settings.async_client = httpx.AsyncClient(timeout=timeout, verify=verify)
+        self.settings._http2 = http2
+        self.settings._limits = limits or httpx.Limits(max_connections=100, max_keepalive_connections=20)  # httpx defaults
+        self.settings.async_client = httpx.AsyncClient(timeout=timeout, verify=verify, http2=http2, limits=self.settings._limits)
         self.settings.delay = AutoDelay(delay_min=delay_min)
         self.settings.logger = Logger(core=self, logger_name=logger_name)
         self.settings.current_loop = asyncio.get_event_loop()
@@ -61,6 +68,8 @@ class APIClient:
                 'base_url': self.settings.async_client.base_url,
                 "verify": bool(self.settings.async_client._transport._pool._ssl_context.verify_mode),  # TODO: Add verify as changeable parameter to settings?
                 "proxy": self.settings.proxy,  # Maybe copy mounts instead?
+                "http2": self.settings._http2,
+                "limits": self.settings._limits,
             }
             self.settings.async_client = httpx.AsyncClient(**client_params)
             self.settings.current_loop = current_loop
@@ -91,6 +100,11 @@ class APIClient:
         print(response.json())
         ```
         """
+        capture = _capture_var.get()
+        if capture is not None:  # Job creation -> Just capture request instead of sending it
+            capture.captured = {"method": method, "endpoint": endpoint, **kwargs}
+            return None
+
         if delay is not None:
             self.settings.delay._delay = delay  # Set delay
         await self.settings.delay.asleep()  # Sleep if needed
@@ -142,23 +156,36 @@ class APIClient:
                         obj[k] = v
             return obj
 
-        self.settings.logger.info(
-            "\n".join(
-                filter(None,
-                       [
-                           f"Request:  {method} {endpoint}",
-                           f"Headers: {mask(obj=dict(client.headers), mask_={'authorization': 'Bearer ****************'})}",
-                           f"Params: {mask(obj=kwargs.get('params', {}), mask_={'secret_answer': '********'})}",
-                           f"Data: {json.dumps(mask(obj=kwargs.get('data', {}), mask_={'secret_answer': '********'}))}" if kwargs.get('data') else None,
-                           f"Json: {json.dumps(mask(obj=kwargs.get('json', {}), mask_={'secret_answer': '********'}))}" if kwargs.get('json') else None,
-                           f"File: {kwargs.get('files')}" if kwargs.get('files') else None
-                       ]
-                       )
+        if self.settings.logger.enabled:  # Don't build log message (stdlib json.dumps of whole body) when nobody reads it
+            self.settings.logger.info(
+                "\n".join(
+                    filter(None,
+                           [
+                               f"Request:  {method} {endpoint}",
+                               f"Headers: {mask(obj=dict(client.headers), mask_={'authorization': 'Bearer ****************'})}",
+                               f"Params: {mask(obj=kwargs.get('params', {}), mask_={'secret_answer': '********'})}",
+                               f"Data: {json.dumps(mask(obj=kwargs.get('data', {}), mask_={'secret_answer': '********'}))}" if kwargs.get('data') else None,
+                               f"Json: {json.dumps(mask(obj=kwargs.get('json', {}), mask_={'secret_answer': '********'}))}" if kwargs.get('json') else None,
+                               f"File: {kwargs.get('files')}" if kwargs.get('files') else None
+                           ]
+                           )
+                )
             )
-        )
+
+        if orjson is not None and kwargs.get("json") is not None:  # orjson serializes straight to bytes and way faster than stdlib json
+            try:
+                content = orjson.dumps(kwargs["json"], option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:  # Something orjson can't handle -> Let httpx do it with stdlib json
+                pass
+            else:
+                headers = httpx.Headers(kwargs.get("headers"))  # Accepts any form httpx does (mapping, list of tuples)
+                headers["Content-Type"] = "application/json"
+                kwargs["content"], kwargs["headers"] = content, headers
+                del kwargs["json"]
 
         response = await client.request(method, endpoint, **kwargs)
-        self.settings.logger.info(f"Response: {method} {endpoint} -> {response.status_code}:\n{response.text}")
+        if self.settings.logger.enabled:
+            self.settings.logger.info(f"Response: {method} {endpoint} -> {response.status_code}:\n{response.text}")
         self.settings.delay._last_request_time = asyncio.get_event_loop().time()
         return response
 
@@ -378,6 +405,8 @@ class Settings:
     _token: str = None
     _base_url: str = None
     _proxy: str = None
+    _http2: bool = False
+    _limits: httpx.Limits = None
 
     def __init__(self, core: APIClient):
         self.core = core
@@ -414,7 +443,7 @@ class Settings:
             raise ValueError("Proxy must start with http://, https:// or socks5://")
         self._proxy = proxy
         self.async_client._mounts = {
-            URLPattern("all://"): httpx.AsyncHTTPTransport(proxy=proxy),
+            URLPattern("all://"): httpx.AsyncHTTPTransport(proxy=proxy, http2=self._http2, limits=self._limits),
         }
 
     @property
@@ -467,17 +496,31 @@ class _NONE:
         """
         if isinstance(obj, dict):
             for key, value in obj.copy().items():
-                if isinstance(value, _NONE):
+                if value is NONE:
                     obj.pop(key)
                 if isinstance(value, (dict, list, tuple)):
                     obj[key] = _NONE.TrimNONE(value)
         elif isinstance(obj, (list, tuple)):
             for value in obj.copy():
-                if isinstance(value, _NONE):
+                if value is NONE:
                     obj.remove(value)
                 if isinstance(value, (dict, list, tuple)):
                     obj[obj.index(value)] = _NONE.TrimNONE(value)
         return obj
 
+    @staticmethod
+    def TrimNONEInto(out: dict, *dicts: dict) -> dict:
+        """
+        Merge dicts into `out` in a single pass skipping NONE
+        """
+        for obj in dicts:
+            for key, value in obj.items():
+                if value is NONE:
+                    continue
+                if isinstance(value, (dict, list, tuple)):
+                    value = _NONE.TrimNONE(value)
+                out[key] = value
+        return out
+
 
 NONE = _NONE()
@@ -1,166 +1,280 @@
 """
 Some useful wrappers
 """
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, TypeVar
-from functools import wraps
+from typing import Callable, Optional, TypeVar
+from contextvars import ContextVar
+from functools import wraps, partial
+import itertools
+import weakref
+import atexit
+import threading
 import asyncio
 import random
 import httpx
-import anyio
 
 T = TypeVar('T', bound=Callable)
 
+_job_counter = itertools.count(1)
 
-def RETRY(count: int = 10):
+
+class _Portal:
+    """
+    Persistent anyio blocking portal (background event loop) for running coroutines from sync context
+    """
+    _portal = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """
+        Get portal (started lazily on first access and stopped at exit)
+        """
+        if cls._portal is None:
+            with cls._lock:
+                if cls._portal is None:
+                    from anyio.from_thread import start_blocking_portal
+                    portal_cm = start_blocking_portal()
+                    cls._portal = portal_cm.__enter__()
+                    atexit.register(portal_cm.__exit__, None, None, None)
+        return cls._portal
+
+
+_thread_local = threading.local()
+
+
+def _thread_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get current thread's event loop to run sync calls on
+
+    Looked up once per thread via asyncio.get_event_loop() (same loop APIClient stores in settings.current_loop) and cached,
+    new one is created only if thread has no loop yet or cached one is closed
+    """
+    loop = getattr(_thread_local, "loop", None)
+    if loop is None or loop.is_closed():
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:  # Thread without loop
+            loop = None
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        _thread_local.loop = loop
+    return loop
+
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+_RETRY_ANY = (httpx.ConnectTimeout,
+              httpx.ReadTimeout,
+              httpx.NetworkError,
+              httpx.RemoteProtocolError)
+_RETRY_UNSENT = (httpx.ConnectError,
+                 httpx.ConnectTimeout,
+                 httpx.PoolTimeout)
+
+
+def _retry_on(method: str) -> tuple:
+    """
+    Exceptions to retry request on
+
+    Evaluated only when request has failed, so anyio (with concurrent.futures) isn't imported until it's really needed
+    """
+    if str(method).upper() not in _SAFE_METHODS:
+        return _RETRY_UNSENT
+    import anyio
+    return _RETRY_ANY + (anyio.EndOfStream,)
+
+
+def RETRY(count: int = 10, base: float = 0.1, cap: float = 30.0):
     """
     Retry wrapper
+
+    Sleeps between attempts with exponential backoff and full jitter -> random(0, min(cap, base * 2 ** attempt))
+
+    Requests with non-idempotent method (taken from `method` argument) are retried only when connection wasn't established,
+    so server will never process them twice
     """
     def decorator(func):
-        @wraps(func)
         async def wrapper(*args, **kwargs):
-            for _ in range(count):
+            method = kwargs.get("method", args[1] if len(args) > 1 else "GET")
+            for attempt in range(count):
                 try:
                     return await func(*args, **kwargs)
-                except (httpx.ConnectTimeout,
-                        httpx.ReadTimeout,
-                        httpx.NetworkError,
-                        httpx.RemoteProtocolError,
-                        anyio.EndOfStream):
+                except _retry_on(method):
                     # TODO: Add error logging here somehow -> e.__class__.__name__
-                    await asyncio.sleep(0.5)
-                    continue
-            return await func(*args, **kwargs)
+                    if attempt == count - 1:
+                        raise
+                    await asyncio.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
+        # Only what's actually used, __qualname__ is checked by UNIVERSAL to detect APIClient.request
+        wrapper.__name__, wrapper.__qualname__, wrapper.__doc__ = func.__name__, func.__qualname__, func.__doc__
         return wrapper
     return decorator
 
 
+class RequestCapture:
+    """
+    Request capture
+
+    While it's set in `_capture_var`, APIClient.request stores its arguments here instead of sending request
+    """
+
+    def __init__(self):
+        self.captured = None
+
+
+_capture_var: ContextVar[Optional[RequestCapture]] = ContextVar("capture", default=None)
+
+
+def _run_now(coro) -> bool:
+    """
+    Run coroutine to the end in current thread without event loop
+
+    Returns False if coroutine needs a loop to proceed. Such coroutine can't be resumed elsewhere
+    (it has already failed or waits on a future of the blocked caller's loop), so it has to be run again from the start
+    """
+    try:
+        coro.send(None)
+    except StopIteration:
+        return True
+    except RuntimeError as e:
+        if str(e) != "no running event loop":  # Real error from method body -> Don't re-run it, just raise
+            raise
+        return False  # Awaited something loop-bound while no loop is running
+    coro.close()
+    return False
+
+
+def _null_job(*args, **kwargs):  # noqa pylint: disable=unused-argument
+    #  Preventing errors when the function is not batchable
+    return None
+
+
+class _Universal:
+    """
+    UNIVERSAL descriptor. Created once per decorated method
+    """
+
+    def __init__(self, func: Callable, batchable: bool = False, set_null_job: bool = True):
+        self.func = func
+        self.batchable = batchable
+        self.set_null_job = set_null_job
+        self.on_request = func.__qualname__ == "APIClient.request"
+        self.has_executor = func.__qualname__ in ["Market.batch", "Forum.batch"]
+        # Jobs of calls without arguments per instance. Endpoint may depend on instance (e.g. Market categories), so it's not shared
+        self.job_templates = weakref.WeakKeyDictionary()
+
+    def __get__(self, instance, owner) -> Callable:  # noqa
+        if instance is None:
+            return self.func
+        return _UniversalMethod(self, instance)
+
+
+class _UniversalMethod:
+    """
+    UNIVERSAL method bound to instance
+    """
+    __slots__ = ("_universal", "_instance")
+
+    def __init__(self, universal: _Universal, instance):
+        self._universal = universal
+        self._instance = instance
+
+    def __call__(self, *args, **kwargs):
+        coro = self._universal.func(self._instance, *args, **kwargs)
+        if asyncio._get_running_loop() is None and _capture_var.get() is None:  # Returns None instead of raising like get_running_loop()
+            return _thread_loop().run_until_complete(coro)
+        return coro
+
+    @property
+    def job(self) -> Callable:
+        if self._universal.batchable:
+            return self._job_on_request if self._universal.on_request else self._job
+        if self._universal.set_null_job:
+            return _null_job
+        raise AttributeError(f"'{self._universal.func.__qualname__}' has no attribute 'job'")
+
+    @property
+    def executor(self) -> Callable:
+        if self._universal.has_executor:
+            return _batch_executor.__get__(self._instance, type(self._instance))  # pylint: disable=no-value-for-parameter
+        raise AttributeError(f"'{self._universal.func.__qualname__}' has no attribute 'executor'")
+
+    def _job_template(self) -> Optional[dict]:
+        try:
+            return self._universal.job_templates.get(self._instance)
+        except TypeError:  # Instance can't be weakly referenced
+            return None
+
+    def _job(self, *args, **kwargs) -> dict:
+        """
+        Returns job for batch request
+        """
+        from .Core import _NONE  # pylint: disable=E0402
+
+        func, instance = self._universal.func, self._instance
+        job_id = kwargs.pop("job_id", None)
+        template = self._job_template() if not args and not kwargs else None
+        if template is not None:
+            return {"id": str(job_id or next(_job_counter)), **template, "params": template["params"].copy()}
+
+        capture = RequestCapture()
+        token = _capture_var.set(capture)
+        try:
+            # Captured request never suspends, so coroutine is driven right in this thread without any loop
+            if not _run_now(func(instance, *args, **kwargs)):
+                # Method awaited something real before request, so let background portal run it again from the start.
+                # Code before that first await runs twice here -> batchable methods must be side-effect free before request
+                _Portal.get().call(partial(func, instance, *args, **kwargs))
+            captured = capture.captured
+
+            params = _NONE.TrimNONEInto({}, captured.get("params") or {}, captured.get("data") or {}, captured.get("json") or {})
+            if not args and not kwargs:
+                try:
+                    self._universal.job_templates[instance] = {"method": captured["method"], "uri": captured["endpoint"], "params": params.copy()}
+                except TypeError:  # Instance can't be weakly referenced -> Just don't cache
+                    pass
+
+            return {
+                "id": str(job_id or next(_job_counter)),
+                "method": captured["method"],
+                "uri": captured["endpoint"],
+                "params": params,
+            }
+        finally:
+            _capture_var.reset(token)
+
+    def _job_on_request(self, method: str, endpoint: str, **kwargs) -> dict:
+        """
+        Returns job for batch request
+        """
+        from .Core import _NONE  # pylint: disable=E0402
+
+        params = _NONE.TrimNONEInto({}, kwargs.get("params") or {}, kwargs.get("data") or {}, kwargs.get("json") or {})
+        return {
+            "id": str(kwargs.get("job_id") or next(_job_counter)),
+            "method": method,
+            "uri": endpoint,
+            "params": params,
+        }
+
+
 def UNIVERSAL(batchable=False, set_null_job=True):
     """
     Universal wrapper to run async function in sync context and create batch jobs
+
+    Batchable methods must not have side effects before `self.core.request(...)` call:
+    if method awaits anything else first, job() runs it once more on the background portal
     """
     def decorator(func: T) -> T:
-        class UniversalWrapper:
-            def __init__(self, func, batchable=False):
-                self.func = func
-                self.batchable = batchable
-
-            def __get__(self, instance, owner) -> Callable:  # noqa
-                if instance is None:
-                    return self.func
-
-                from .Core import _NONE  # pylint: disable=E0402
-
-                class RequestCapture:
-                    """
-                    Request capture
-                    """
-
-                    def __init__(self):
-                        self.captured = None
-
-                    async def __call__(self, method: str, endpoint: str, **kwargs):
-                        self.captured = {
-                            "method": method,
-                            "endpoint": endpoint,
-                            **kwargs
-                        }
-                        return None
-
-                def job(*args, **kwargs) -> dict:
-                    """
-                    Returns job for batch request
-                    """
-                    capture = RequestCapture()
-                    if hasattr(instance, "core"):
-                        head_instance = instance.core
-                    else:
-                        head_instance = instance
-
-                    original_request = head_instance.request
-                    head_instance.request = capture
-
-                    def _worker():
-                        async def method_wrapper(*args, **kwargs):
-                            return await self.func(instance, *args, **kwargs)
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        try:
-                            return loop.run_until_complete(method_wrapper(*args, **kwargs))
-                        finally:
-                            loop.close()
-
-                    try:
-                        with ThreadPoolExecutor() as executor:
-                            executor.submit(_worker).result()
-                        captured = capture.captured
-
-                        params = _NONE.TrimNONE(captured.get("params", {}))
-                        params.update(_NONE.TrimNONE(captured.get("data", {})))
-                        params.update(_NONE.TrimNONE(captured.get("json", {})))
-
-                        return {
-                            "id": str(kwargs.get("job_id", random.randint(1000000, 9999999))),
-                            "method": captured["method"],
-                            "uri": captured["endpoint"],
-                            "params": params,
-                        }
-                    finally:
-                        head_instance.request = original_request
-
-                def job_on_request(method: str, endpoint: str, **kwargs) -> dict:
-                    """
-                    Returns job for batch request
-                    """
-                    params = _NONE.TrimNONE(kwargs.get("params", {}))
-                    params.update(_NONE.TrimNONE(kwargs.get("data", {})))
-                    params.update(_NONE.TrimNONE(kwargs.get("json", {})))
-                    return {
-                        "id": str(kwargs.get("job_id", random.randint(1, 1000000))),
-                        "method": method,
-                        "uri": endpoint,
-                        "params": params,
-                    }
-
-                def null_job(*args, **kwargs):  # noqa pylint: disable=unused-argument
-                    #  Preventing errors when the function is not batchable
-                    return None
-
-                def wrapper(*args, **kwargs):
-                    async def run():
-                        return await self.func(instance, *args, **kwargs)
-                    try:
-                        loop = asyncio.get_event_loop()
-                    except RuntimeError:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-
-                    if loop.is_running():
-                        return run()
-                    else:
-                        return loop.run_until_complete(run())
-
-                if self.batchable:
-                    if self.func.__qualname__ == "APIClient.request":
-                        setattr(wrapper, "job", job_on_request)
-                    else:
-                        setattr(wrapper, "job", job)
-                elif set_null_job:
-                    setattr(wrapper, "job", null_job)
-
-                # TODO: Should refactor this shitcode someday
-                if self.func.__qualname__ in ["Market.batch", "Forum.batch"]:
-                    @UNIVERSAL(set_null_job=False)
-                    async def executor(self, jobs: list[dict[str, str]]) -> tuple[list[dict[str, str]], httpx.Response]:
-                        jobs_to_proceed = []
-                        while jobs:
-                            jobs_to_proceed.append(jobs.pop(0))
-                            if len(jobs_to_proceed) == 10:
-                                break
-                        return jobs, await self.core.batch(jobs=jobs_to_proceed)
-                    setattr(wrapper, "executor", executor.__get__(instance, type(instance)))  # pylint: disable=no-value-for-parameter
-                return wrapper
-
-        return UniversalWrapper(func, batchable=batchable)
+        return _Universal(func, batchable=batchable, set_null_job=set_null_job)
 
     return decorator
+
+
+@UNIVERSAL(set_null_job=False)
+async def _batch_executor(self, jobs: list[dict[str, str]]) -> tuple[list[dict[str, str]], httpx.Response]:
+    jobs_to_proceed = []
+    while jobs:
+        jobs_to_proceed.append(jobs.pop(0))
+        if len(jobs_to_proceed) == 10:
+            break
+    return jobs, await self.core.batch(jobs=jobs_to_proceed)
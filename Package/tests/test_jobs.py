@@ -0,0 +1,25 @@
+import base64
+import json
+import unittest
+
+from LOLZTEAM.Client import Market
+
+
+def make_token() -> str:
+    payload = base64.b64encode(json.dumps({"sub": 1, "scope": "basic read", "jti": 1}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+class JobTemplateTest(unittest.TestCase):
+    def test_argumentless_job_is_not_shared_between_categories(self):
+        market = Market(token=make_token())
+        steam = market.categories.steam.params.job()
+        fortnite = market.categories.fortnite.params.job()
+        self.assertEqual(steam["uri"], "/steam/params")
+        self.assertEqual(fortnite["uri"], "/fortnite/params")
+        self.assertEqual(market.categories.steam.params.job()["uri"], "/steam/params")
+        self.assertEqual(market.categories.fortnite.params.job()["uri"], "/fortnite/params")
+
+
+if __name__ == "__main__":
+    unittest.main()